@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import Movie, Show, Booking
+from django.contrib import admin, messages
+from .models import Movie, Show, Booking, WaitlistEntry, ArchivedShow, ArchivedBooking
+from .bulk import cancel_show_bookings, reschedule_show_bookings
 
 
 @admin.register(Movie)
@@ -11,14 +12,40 @@ class MovieAdmin(admin.ModelAdmin):
 
 @admin.register(Show)
 class ShowAdmin(admin.ModelAdmin):
-    list_display = ['id', 'movie', 'screen_name', 'date_time', 'total_seats', 'available_seats']
+    list_display = ['id', 'movie', 'screen_name', 'date_time', 'total_seats', 'available_seats', 'change_version']
     search_fields = ['movie__title', 'screen_name']
     list_filter = ['date_time', 'screen_name']
     date_hierarchy = 'date_time'
+    readonly_fields = ['change_version']
+    actions = ['cancel_all_bookings', 'move_bookings_to_next_show']
     
     def available_seats(self, obj):
         return obj.available_seats
     available_seats.short_description = 'Available Seats'
+    
+    @admin.action(description='Cancel all bookings of selected shows')
+    def cancel_all_bookings(self, request, queryset):
+        for show in queryset:
+            seats = cancel_show_bookings(show.id)
+            self.message_user(request, f'{show}: cancelled {len(seats)} bookings')
+    
+    @admin.action(description='Move bookings of selected shows to the next show of the same movie')
+    def move_bookings_to_next_show(self, request, queryset):
+        for show in queryset:
+            target = Show.objects.filter(
+                movie_id=show.movie_id,
+                date_time__gt=show.date_time
+            ).order_by('date_time').first()
+            if target is None:
+                self.message_user(request, f'{show}: no later show to move bookings to', messages.WARNING)
+                continue
+            
+            seats = reschedule_show_bookings(show.id, target.id)
+            moved = sum(1 for seat in seats if seat['outcome'] == 'moved')
+            self.message_user(
+                request,
+                f'{show}: moved {moved} bookings to show {target.id}, cancelled {len(seats) - moved}'
+            )
 
 
 @admin.register(Booking)
@@ -27,4 +54,26 @@ class BookingAdmin(admin.ModelAdmin):
     search_fields = ['user_username', 'showmovie_title']
     list_filter = ['status', 'created_at']
     date_hierarchy = 'created_at'
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'show', 'status', 'booking', 'created_at']
+    search_fields = ['user__username', 'show__movie__title']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(ArchivedShow)
+class ArchivedShowAdmin(admin.ModelAdmin):
+    list_display = ['id', 'original_id', 'movie', 'screen_name', 'date_time', 'archived_at']
+    search_fields = ['movie__title', 'screen_name']
+    list_filter = ['date_time']
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = ['id', 'original_id', 'user', 'show', 'seat_number', 'status', 'archived_at']
+    search_fields = ['user__username', 'show__movie__title']
+    list_filter = ['status', 'archived_at']
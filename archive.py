@@ -0,0 +1,108 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Show, Booking, ArchivedShow, ArchivedBooking
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 30
+DEFAULT_ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_cutoff(days=None):
+    """
+    Shows that started before the returned datetime are eligible for archival
+    """
+    if days is None:
+        days = getattr(settings, 'BOOKING_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def _ensure_archived_shows(show_ids):
+    """
+    Create the archive rows for these shows if missing and return a map of
+    live show id to archived show id
+    """
+    existing = set(
+        ArchivedShow.objects.filter(original_id__in=show_ids).values_list('original_id', flat=True)
+    )
+    ArchivedShow.objects.bulk_create([
+        ArchivedShow(
+            original_id=show.id,
+            movie_id=show.movie_id,
+            screen_name=show.screen_name,
+            date_time=show.date_time,
+            total_seats=show.total_seats,
+            created_at=show.created_at,
+        )
+        for show in Show.objects.filter(id__in=show_ids).exclude(id__in=existing)
+    ])
+    # bulk_create does not set primary keys on every backend
+    return dict(
+        ArchivedShow.objects.filter(original_id__in=show_ids).values_list('original_id', 'id')
+    )
+
+
+def archive_show_batch(cutoff, batch_size):
+    """
+    Move at most batch_size bookings of past shows into the archive tables in
+    a single transaction, then remove the shows that have no bookings left.
+    A large show is spread over several batches so every transaction stays
+    short. Returns (shows, bookings) moved.
+    """
+    with transaction.atomic():
+        bookings = list(
+            Booking.objects.filter(show__date_time__lt=cutoff).order_by('show_id', 'id')[:batch_size]
+        )
+        if bookings:
+            show_ids = {booking.show_id for booking in bookings}
+        else:
+            # Only past shows without bookings are left
+            show_ids = set(
+                Show.objects.filter(date_time__lt=cutoff).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not show_ids:
+                return 0, 0
+        
+        archived_ids = _ensure_archived_shows(show_ids)
+        ArchivedBooking.objects.bulk_create([
+            ArchivedBooking(
+                original_id=booking.id,
+                user_id=booking.user_id,
+                show_id=archived_ids[booking.show_id],
+                seat_number=booking.seat_number,
+                status=booking.status,
+                created_at=booking.created_at,
+                updated_at=booking.updated_at,
+            )
+            for booking in bookings
+        ])
+        Booking.objects.filter(id__in=[booking.id for booking in bookings]).delete()
+        
+        # Shows whose last bookings were just moved can go; deleting them
+        # cascades to their waitlist entries and seat changes
+        finished = list(
+            Show.objects.filter(id__in=show_ids, bookings__isnull=True).values_list('id', flat=True)
+        )
+        Show.objects.filter(id__in=finished).delete()
+        
+        return len(finished), len(bookings)
+
+
+def archive_past_shows(cutoff=None, batch_size=None):
+    """
+    Archive every show older than the cutoff, at most batch_size bookings
+    per transaction.
+    Returns the total (shows, bookings) moved.
+    """
+    if cutoff is None:
+        cutoff = archive_cutoff()
+    if batch_size is None:
+        batch_size = getattr(settings, 'BOOKING_ARCHIVE_BATCH_SIZE', DEFAULT_ARCHIVE_BATCH_SIZE)
+    
+    total_shows = total_bookings = 0
+    while True:
+        shows, bookings = archive_show_batch(cutoff, batch_size)
+        if not shows and not bookings:
+            return total_shows, total_bookings
+        total_shows += shows
+        total_bookings += bookings
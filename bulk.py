@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.utils import timezone
+from .models import Show, Booking, WaitlistEntry
+from .routers import pin_to_primary
+from .changes import record_seat_changes
+from .metrics import CANCEL_TOTAL, RESCHEDULED_TOTAL
+
+
+def cancel_show_bookings(show_id):
+    """
+    Cancel every live booking and waitlist entry of a show with set-based
+    updates in one transaction. Returns per-seat outcomes.
+    """
+    with transaction.atomic():
+        Show.objects.select_for_update().get(id=show_id)
+        live = Booking.objects.select_for_update().filter(show_id=show_id, status='booked')
+        seats = list(live.order_by('seat_number').values_list('id', 'seat_number', 'user_id'))
+        
+        live.update(status='cancelled', updated_at=timezone.now())
+        record_seat_changes(show_id, [(seat_number, True) for _, seat_number, _ in seats])
+        WaitlistEntry.objects.filter(show_id=show_id, status='waiting').update(
+            status='cancelled', updated_at=timezone.now()
+        )
+    
+    pin_to_primary(*{user_id for _, _, user_id in seats})
+    CANCEL_TOTAL.inc(len(seats), outcome='bulk_cancelled')
+    return [
+        {'booking_id': booking_id, 'seat_number': seat_number, 'outcome': 'cancelled'}
+        for booking_id, seat_number, _ in seats
+    ]
+
+
+def reschedule_show_bookings(show_id, target_show_id):
+    """
+    Move every live booking of a show to the same seat number on the target
+    show where that seat exists and is free; cancel the rest. Runs as two
+    set-based updates in one transaction. Returns per-seat outcomes.
+    """
+    with transaction.atomic():
+        # Lock both shows in a stable order to avoid deadlocks
+        shows = {
+            show.id: show
+            for show in Show.objects.select_for_update().filter(
+                id__in=[show_id, target_show_id]
+            ).order_by('id')
+        }
+        if show_id not in shows:
+            raise Show.DoesNotExist(f'Show {show_id} not found')
+        if target_show_id not in shows:
+            raise Show.DoesNotExist(f'Show {target_show_id} not found')
+        target = shows[target_show_id]
+        
+        live = Booking.objects.select_for_update().filter(show_id=show_id, status='booked')
+        seats = list(live.order_by('seat_number').values_list('id', 'seat_number', 'user_id'))
+        
+        taken = Booking.objects.filter(
+            show_id=target_show_id,
+            status='booked'
+        ).values('seat_number')
+        movable = live.filter(seat_number__lte=target.total_seats).exclude(seat_number__in=taken)
+        moved_ids = set(movable.values_list('id', flat=True))
+        
+        now = timezone.now()
+        movable.update(show_id=target_show_id, updated_at=now)
+        live.update(status='cancelled', updated_at=now)
+        record_seat_changes(show_id, [(seat_number, True) for _, seat_number, _ in seats])
+        record_seat_changes(target_show_id, [
+            (seat_number, False) for booking_id, seat_number, _ in seats if booking_id in moved_ids
+        ])
+        WaitlistEntry.objects.filter(show_id=show_id, status='waiting').update(
+            status='cancelled', updated_at=now
+        )
+    
+    pin_to_primary(*{user_id for _, _, user_id in seats})
+    RESCHEDULED_TOTAL.inc(len(moved_ids))
+    CANCEL_TOTAL.inc(len(seats) - len(moved_ids), outcome='bulk_cancelled')
+    return [
+        {
+            'booking_id': booking_id,
+            'seat_number': seat_number,
+            'outcome': 'moved' if booking_id in moved_ids else 'cancelled',
+        }
+        for booking_id, seat_number, _ in seats
+    ]
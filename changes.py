@@ -0,0 +1,169 @@
+"""
+Per-show feed of seat availability changes.
+
+Every transaction that books or frees seats bumps Show.change_version once
+and records the affected seats under that version. Clients ask for
+/shows/<id>/changes/?since=<version> and get only the seats that changed
+after it, either as a long-poll or, under the ASGI application, as a
+Server-Sent Events stream. The view is async and waits on the event loop;
+its database reads run on the loop's shared, bounded executor, so waiting
+clients do not each hold a database connection.
+"""
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
+from .models import Show, SeatChange
+from .metrics import CACHE_REQUESTS_TOTAL
+
+DEFAULT_POLL_INTERVAL = 0.5
+DEFAULT_LONG_POLL_TIMEOUT = 25
+SSE_KEEPALIVE_SECONDS = 15
+
+# show_id -> (version, monotonic time fetched); shared by all waiters in this process
+_version_cache = {}
+
+
+def record_seat_changes(show_id, seats):
+    """
+    Bump the show's change version and record (seat_number, is_available)
+    pairs under it. Must be called inside the writing transaction.
+    """
+    seats = list(seats)
+    if not seats:
+        return None
+
+    # The UPDATE row-locks the show, so concurrent writers get distinct versions
+    Show.objects.filter(id=show_id).update(change_version=F('change_version') + 1)
+    version = Show.objects.filter(id=show_id).values_list('change_version', flat=True).get()
+    SeatChange.objects.bulk_create([
+        SeatChange(show_id=show_id, seat_number=seat_number, is_available=is_available, version=version)
+        for seat_number, is_available in seats
+    ])
+    return version
+
+
+def changes_since(show_id, since):
+    """
+    Latest availability of every seat changed after `since`, by seat number
+    """
+    latest = {}
+    rows = SeatChange.objects.filter(
+        show_id=show_id,
+        version__gt=since
+    ).order_by('version', 'id').values_list('seat_number', 'is_available', 'version')
+    for seat_number, is_available, version in rows:
+        latest[seat_number] = {'seat_number': seat_number, 'available': is_available, 'version': version}
+    return [latest[seat_number] for seat_number in sorted(latest)]
+
+
+def _poll_interval():
+    return getattr(settings, 'BOOKING_CHANGES_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+
+
+def _load_version(show_id):
+    return Show.objects.filter(id=show_id).values_list('change_version', flat=True).first()
+
+
+def _run_read(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # Executor threads outlive the request, so request_finished never
+        # closes their connections
+        close_old_connections()
+
+
+async def _read(func, *args):
+    """
+    Run a database read on the shared executor. The default thread-sensitive
+    mode would give every request under the ASGI handler a thread and a
+    connection of its own.
+    """
+    return await sync_to_async(_run_read, thread_sensitive=False)(func, *args)
+
+
+async def current_version(show_id):
+    """
+    Current change version of a show, or None if it does not exist. Hits the
+    database at most once per poll interval per show in this process.
+    """
+    now = time.monotonic()
+    cached = _version_cache.get(show_id)
+    if cached is not None and now - cached[1] < _poll_interval():
+        CACHE_REQUESTS_TOTAL.inc(cache='show_versions', result='hit')
+        return cached[0]
+    CACHE_REQUESTS_TOTAL.inc(cache='show_versions', result='miss')
+    version = await _read(_load_version, show_id)
+    _version_cache[show_id] = (version, now)
+    return version
+
+
+async def _payload(show_id, since, version):
+    changes = await _read(changes_since, show_id, since)
+    return {'show_id': show_id, 'version': version, 'changes': changes}
+
+
+async def _event_stream(show_id, since):
+    last_sent = time.monotonic()
+    while True:
+        version = await current_version(show_id)
+        if version is None:
+            return
+        if version > since:
+            payload = await _payload(show_id, since, version)
+            yield f'id: {version}\nevent: seats\ndata: {json.dumps(payload)}\n\n'
+            since = version
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(_poll_interval())
+
+
+async def show_changes_view(request, show_id):
+    """
+    Seats of a show that changed since ?since=<version>.
+    Long-polls for up to ?timeout= seconds, or streams Server-Sent Events
+    when the client sends Accept: text/event-stream. WSGI servers buffer an
+    async stream in full before sending it, so they always get the long-poll.
+    """
+    try:
+        since = int(request.GET.get('since', request.headers.get('Last-Event-ID', 0)))
+        max_timeout = getattr(settings, 'BOOKING_CHANGES_LONG_POLL_TIMEOUT', DEFAULT_LONG_POLL_TIMEOUT)
+        timeout = min(float(request.GET.get('timeout', max_timeout)), max_timeout)
+    except ValueError:
+        return JsonResponse({'error': 'since and timeout must be numbers.'}, status=400)
+    if since < 0 or timeout < 0:
+        return JsonResponse({'error': 'since and timeout must not be negative.'}, status=400)
+
+    # The first check is always fresh; only waiting clients share the cached version
+    version = await _read(_load_version, show_id)
+    if version is None:
+        return JsonResponse({'error': 'Show not found'}, status=404)
+    if since > version:
+        # Client is ahead of the server (e.g. a stale version); resend everything
+        since = 0
+
+    wants_stream = 'text/event-stream' in request.headers.get('Accept', '')
+    if wants_stream and isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_event_stream(show_id, since), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    deadline = time.monotonic() + timeout
+    while version == since and time.monotonic() < deadline:
+        await asyncio.sleep(min(_poll_interval(), max(deadline - time.monotonic(), 0)))
+        latest = await current_version(show_id)
+        if latest is None:
+            return JsonResponse({'error': 'Show not found'}, status=404)
+        # The shared cached version may be older than our fresh read
+        version = max(version, latest)
+
+    return JsonResponse(await _payload(show_id, since, version))
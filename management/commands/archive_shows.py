@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from ...archive import archive_cutoff, archive_past_shows
+
+
+class Command(BaseCommand):
+    help = 'Move past shows and their bookings out of the live tables into the archive'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Archive shows that started more than this many days ago '
+                 '(default: BOOKING_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Bookings moved per transaction (default: BOOKING_ARCHIVE_BATCH_SIZE)'
+        )
+    
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        shows, bookings = archive_past_shows(cutoff, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {shows} shows and {bookings} bookings older than {cutoff:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,330 @@
+"""
+In-process metrics for the booking hot path, exposed at /metrics in the
+Prometheus text exposition format.
+
+Each process keeps its own counters and histograms behind a single lock.
+When BOOKING_METRICS_DIR is set, every process periodically writes a
+snapshot to <dir>/<pid>.json and /metrics sums the snapshots of all
+workers.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def metrics_dir(self):
+        return getattr(settings, 'BOOKING_METRICS_DIR', None)
+
+    def maybe_flush(self):
+        """
+        Write this process's snapshot to the shared directory at most once
+        per FLUSH_INTERVAL_SECONDS
+        """
+        if not self.metrics_dir():
+            return
+        now = time.monotonic()
+        if now - self._last_flush < FLUSH_INTERVAL_SECONDS:
+            return
+        self._last_flush = now
+        try:
+            self.flush()
+        except OSError:
+            # Metrics must never fail a booking request
+            pass
+
+    def flush(self):
+        directory = self.metrics_dir()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        Return the snapshot to expose: this process alone, or the sum of
+        every worker's snapshot when a shared directory is configured
+        """
+        directory = self.metrics_dir()
+        if not directory:
+            return self.snapshot()
+
+        self.flush()
+        merged = {}
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                # Another worker is mid-write or the file vanished
+                continue
+            for name, metric in snapshot.items():
+                _merge_metric(merged, name, metric)
+        return merged
+
+    def render(self):
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            labelnames = metric['labelnames']
+            for key, value in sorted(metric['samples'].items()):
+                labels = list(zip(labelnames, json.loads(key)))
+                if metric['type'] == 'counter':
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                bounds = [str(b) for b in metric['buckets']] + ['+Inf']
+                for bound, count in zip(bounds, value['buckets']):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{_format_labels(labels + [("le", bound)])} {cumulative}'
+                    )
+                lines.append(f'{name}_sum{_format_labels(labels)} {value["sum"]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self._values = {}
+        self.registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+    def snapshot(self):
+        return {
+            'type': 'counter',
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': dict(self._values),
+        }
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.registry = registry or REGISTRY
+        self._values = {}
+        self.registry.register(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+        self.registry.maybe_flush()
+
+    def snapshot(self):
+        return {
+            'type': 'histogram',
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'buckets': list(self.buckets),
+            'samples': {
+                key: {'buckets': list(counts), 'sum': total, 'count': count}
+                for key, (counts, total, count) in self._values.items()
+            },
+        }
+
+
+def _label_key(labelnames, labels):
+    return json.dumps([str(labels[name]) for name in labelnames])
+
+
+def _merge_metric(merged, name, metric):
+    if name not in merged:
+        merged[name] = dict(metric, samples={})
+    samples = merged[name]['samples']
+    for key, value in metric['samples'].items():
+        if metric['type'] == 'counter':
+            samples[key] = samples.get(key, 0) + value
+        elif key not in samples:
+            samples[key] = {'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']}
+        else:
+            current = samples[key]
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+            current['sum'] += value['sum']
+            current['count'] += value['count']
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = (f'{name}="{_escape_label_value(value)}"' for name, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+BOOK_SEAT_TOTAL = Counter(
+    'booking_book_seat_total', 'Seat booking attempts by outcome', ['outcome']
+)
+BOOK_SEAT_DURATION = Histogram(
+    'booking_book_seat_duration_seconds', 'Seat booking latency by outcome', ['outcome']
+)
+CANCEL_TOTAL = Counter(
+    'booking_cancel_total', 'Booking cancellation attempts by outcome', ['outcome']
+)
+RESCHEDULED_TOTAL = Counter(
+    'booking_rescheduled_total', 'Bookings moved to another show by staff'
+)
+WAITLIST_PROMOTIONS_TOTAL = Counter(
+    'booking_waitlist_promotions_total', 'Freed seats booked for the head of a waitlist'
+)
+LOCK_WAIT = Histogram(
+    'booking_lock_wait_seconds', 'Time spent acquiring booking row locks', ['view']
+)
+CACHE_REQUESTS_TOTAL = Counter(
+    'booking_cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result']
+)
+HTTP_REQUESTS_TOTAL = Counter(
+    'booking_http_requests_total', 'HTTP requests by view and status code', ['view', 'status']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'booking_http_request_duration_seconds', 'HTTP request latency by view', ['view']
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    'booking_http_request_queries', 'Database queries per HTTP request by view', ['view'],
+    buckets=QUERY_COUNT_BUCKETS
+)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and database query count of every request.
+    Async-capable, so async views such as the seat change long-poll are
+    not forced onto a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        _record_request(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        _record_request(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Under ASGI a sync view runs on a different thread from this
+        # middleware; process_view runs on that same thread, so make sure the
+        # connections the view will use there are counted
+        for alias in connections:
+            _instrument_connection(connections[alias])
+        return None
+
+
+# Query counter of the request being handled; contextvars follow the request
+# into the threads sync_to_async runs its database work on
+_request_queries = ContextVar('booking_request_queries', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _instrument_connection(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        # Outermost, so execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_instrument_connection)
+
+
+def _record_request(request, response, elapsed, queries):
+    match = getattr(request, 'resolver_match', None)
+    view = match.url_name if match and match.url_name else 'unmatched'
+    HTTP_REQUESTS_TOTAL.inc(view=view, status=response.status_code)
+    HTTP_REQUEST_DURATION.observe(elapsed, view=view)
+    HTTP_REQUEST_QUERIES.observe(queries, view=view)
+
+
+def metrics_view(request):
+    """
+    Expose all metrics in the Prometheus text exposition format
+    """
+    return HttpResponse(
+        REGISTRY.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -19,6 +19,8 @@ class Show(models.Model):
     screen_name = models.CharField(max_length=100)
     date_time = models.DateTimeField()
     total_seats = models.IntegerField(validators=[MinValueValidator(1)])
+    # Bumped once per transaction that books or frees seats of this show
+    change_version = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def _str_(self):
@@ -51,7 +53,102 @@ class Booking(models.Model):
     
     class Meta:
         ordering = ['-created_at']
-        unique_together = ['show', 'seat_number', 'status']
+        constraints = [
+            # Only one live booking per seat; a seat can be cancelled many times
+            models.UniqueConstraint(
+                fields=['show', 'seat_number'],
+                condition=models.Q(status='booked'),
+                name='unique_booked_seat_per_show',
+            ),
+        ]
         indexes = [
             models.Index(fields=['show', 'seat_number', 'status']),
-        ]
\ No newline at end of file
+        ]
+
+
+class WaitlistEntry(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    show = models.ForeignKey(Show, on_delete=models.CASCADE, related_name='waitlist_entries')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    booking = models.OneToOneField(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='waitlist_entry'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def _str_(self):
+        return f"{self.user.username} - {self.show} - {self.status}"
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        constraints = [
+            # A user can hold at most one place in a show's queue
+            models.UniqueConstraint(
+                fields=['show', 'user'],
+                condition=models.Q(status='waiting'),
+                name='unique_waiting_user_per_show',
+            ),
+        ]
+        indexes = [
+            # FIFO head lookup: next waiter for a show
+            models.Index(fields=['show', 'status', 'created_at']),
+        ]
+
+
+class SeatChange(models.Model):
+    show = models.ForeignKey(Show, on_delete=models.CASCADE, related_name='seat_changes')
+    seat_number = models.IntegerField()
+    is_available = models.BooleanField()
+    version = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def _str_(self):
+        return f"{self.show} - Seat {self.seat_number} - v{self.version}"
+    
+    class Meta:
+        ordering = ['version', 'id']
+        indexes = [
+            models.Index(fields=['show', 'version']),
+        ]
+
+
+class ArchivedShow(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='archived_shows')
+    screen_name = models.CharField(max_length=100)
+    date_time = models.DateTimeField()
+    total_seats = models.IntegerField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def _str_(self):
+        return f"{self.movie.title} - {self.screen_name} - {self.date_time} (archived)"
+    
+    class Meta:
+        ordering = ['date_time']
+
+
+class ArchivedBooking(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    show = models.ForeignKey(ArchivedShow, on_delete=models.CASCADE, related_name='bookings')
+    seat_number = models.IntegerField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def _str_(self):
+        return f"{self.user.username} - {self.show} - Seat {self.seat_number}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
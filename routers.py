@@ -0,0 +1,97 @@
+"""
+Send catalog and booking-history reads to a read replica.
+
+Views opt in with `replica_reads(request.user)`; everything else, and all
+writes, stays on `default`. A user who just booked or cancelled is pinned to
+the primary for BOOKING_REPLICA_PIN_SECONDS so they always see their own
+change, even while the replica lags behind. Pins are kept in the
+BOOKING_REPLICA_PIN_CACHE cache, which must be shared by all workers.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from .metrics import CACHE_REQUESTS_TOTAL
+
+DEFAULT_PIN_SECONDS = 5
+DEFAULT_PIN_CACHE = 'default'
+PIN_KEY = 'booking:pin-primary:{}'
+
+_read_alias = ContextVar('booking_read_alias', default=None)
+
+
+def replica_alias():
+    """
+    The configured replica alias, or `default` when no replica is set up
+    """
+    alias = getattr(settings, 'BOOKING_REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else 'default'
+
+
+def pin_cache():
+    return caches[getattr(settings, 'BOOKING_REPLICA_PIN_CACHE', DEFAULT_PIN_CACHE)]
+
+
+class PinCache(FileBasedCache):
+    """
+    File-based cache shared by all workers on a host that never evicts a live
+    pin. Once MAX_ENTRIES is reached it sweeps expired pins instead of
+    deleting a random sample, which could drop the pin of a user who just wrote.
+    """
+    def _cull(self):
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        for fname in filelist:
+            try:
+                with open(fname, 'rb') as f:
+                    # Deletes the file when it has expired
+                    self._is_expired(f)
+            except FileNotFoundError:
+                # Another worker removed it first
+                pass
+
+
+def pin_to_primary(*user_ids):
+    """
+    Route reads of these users to the primary for the next few seconds
+    """
+    timeout = getattr(settings, 'BOOKING_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+    pin_cache().set_many({PIN_KEY.format(user_id): True for user_id in user_ids}, timeout)
+
+
+def is_pinned(user):
+    if user is None or not user.is_authenticated:
+        return False
+    pinned = pin_cache().get(PIN_KEY.format(user.id), False)
+    CACHE_REQUESTS_TOTAL.inc(cache='replica_pins', result='hit' if pinned else 'miss')
+    return pinned
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Route reads made inside the block to the replica unless `user` recently wrote
+    """
+    alias = 'default' if is_pinned(user) else replica_alias()
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
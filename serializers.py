@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import Movie, Show, Booking
+from .models import Movie, Show, Booking, WaitlistEntry, ArchivedBooking
 
 
 class UserSignupSerializer(serializers.ModelSerializer):
@@ -66,4 +66,36 @@ class BookingSerializer(serializers.ModelSerializer):
 
 
 class BookSeatSerializer(serializers.Serializer):
-    seat_number = serializers.IntegerField(min_value=1, required=True)
\ No newline at end of file
+    seat_number = serializers.IntegerField(min_value=1, required=True)
+
+
+class RescheduleShowSerializer(serializers.Serializer):
+    target_show_id = serializers.IntegerField(min_value=1, required=True)
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    movie_title = serializers.CharField(source='show.movie.title', read_only=True)
+    show_time = serializers.DateTimeField(source='show.date_time', read_only=True)
+    
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'user', 'show', 'movie_title', 'show_time', 'status',
+                  'booking', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='original_id', read_only=True)
+    user_username = serializers.CharField(source='user.username', read_only=True)
+    show = serializers.IntegerField(source='show.original_id', read_only=True)
+    movie_title = serializers.CharField(source='show.movie.title', read_only=True)
+    screen_name = serializers.CharField(source='show.screen_name', read_only=True)
+    show_time = serializers.DateTimeField(source='show.date_time', read_only=True)
+    archived = serializers.BooleanField(default=True, read_only=True)
+    
+    class Meta:
+        model = ArchivedBooking
+        fields = ['id', 'user', 'user_username', 'show', 'movie_title',
+                  'screen_name', 'show_time', 'seat_number', 'status',
+                  'created_at', 'updated_at', 'archived']
+        read_only_fields = fields
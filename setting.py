@@ -1,3 +1,5 @@
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -23,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +62,36 @@ DATABASES = {
     }
 }
 
+# Read replica for catalog and booking-history reads. It is the primary's own
+# file unless BOOKING_REPLICA_DB_NAME points at a second SQLite file (e.g. a
+# copy of db.sqlite3) standing in for a real replica.
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / os.environ.get('BOOKING_REPLICA_DB_NAME', 'db.sqlite3'),
+}
+
+DATABASE_ROUTERS = ['booking.routers.ReplicaRouter']
+BOOKING_REPLICA_DATABASE = 'replica'
+# Users who just booked or cancelled read from the primary for this long
+BOOKING_REPLICA_PIN_SECONDS = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Read-your-writes pins must be seen by every worker process, so they
+    # live in a cache shared across processes rather than per-process memory.
+    # PinCache only ever evicts expired pins.
+    'replica_pins': {
+        'BACKEND': 'booking.routers.PinCache',
+        'LOCATION': os.environ.get(
+            'BOOKING_REPLICA_PIN_DIR',
+            os.path.join(tempfile.gettempdir(), 'booking-replica-pins')
+        ),
+    },
+}
+BOOKING_REPLICA_PIN_CACHE = 'replica_pins'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,4 +144,16 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
-}
\ No newline at end of file
+}
+
+# Shows older than this are moved to the archive tables by `manage.py archive_shows`
+BOOKING_ARCHIVE_AFTER_DAYS = 30
+# Bookings moved per transaction, so each batch holds locks only briefly
+BOOKING_ARCHIVE_BATCH_SIZE = 500
+
+# Shared directory for aggregating /metrics across worker processes (optional)
+BOOKING_METRICS_DIR = os.environ.get('BOOKING_METRICS_DIR')
+
+# Seat change feed: how often waiting clients re-check a show, and the longest long-poll
+BOOKING_CHANGES_POLL_INTERVAL = 0.5
+BOOKING_CHANGES_LONG_POLL_TIMEOUT = 25
@@ -1,11 +1,38 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.core.asgi import get_asgi_application
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from rest_framework import status
+from django.core.management import call_command
 from datetime import datetime, timedelta
-from .models import Movie, Show, Booking
+from io import StringIO
+from unittest import mock
+from .models import Movie, Show, Booking, WaitlistEntry, ArchivedShow, ArchivedBooking
+from .routers import ReplicaRouter, PinCache, PIN_KEY, replica_reads, pin_cache
+from .changes import record_seat_changes
+from .metrics import HTTP_REQUEST_QUERIES, CANCEL_TOTAL
 
+# Keep read-your-writes pins in memory so tests never touch the shared pin directory
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'replica_pins': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'booking-test-replica-pins',
+    },
+}
 
+
+# Only ReplicaRoutingTestCase sets up a replica; list reads here use the primary
+@override_settings(CACHES=TEST_CACHES, BOOKING_REPLICA_DATABASE='default')
 class BookingTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -154,4 +181,386 @@ class BookingTestCase(TestCase):
         # Get bookings
         response = self.client.get('/my-bookings/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
\ No newline at end of file
+        self.assertEqual(len(response.data), 2)
+    
+    def _login_client(self, username, **user_kwargs):
+        User.objects.create_user(
+            username=username,
+            password='testpass123',
+            **user_kwargs
+        )
+        client = APIClient()
+        response = client.post('/login/', {
+            'username': username,
+            'password': 'testpass123'
+        })
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        return client
+    
+    def test_join_waitlist_requires_full_show(self):
+        """Test that the waitlist is only open once a show is sold out"""
+        response = self.client.post(f'/shows/{self.show.id}/waitlist/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(WaitlistEntry.objects.count(), 0)
+    
+    def test_cancel_promotes_next_waiter(self):
+        """Test that cancelling hands the freed seat to the first waiter"""
+        for i in range(1, 11):
+            self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': i})
+        
+        client2 = self._login_client('testuser2')
+        response = client2.post(f'/shows/{self.show.id}/waitlist/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['position'], 1)
+        
+        # Joining twice is rejected
+        response = client2.post(f'/shows/{self.show.id}/waitlist/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        booking = Booking.objects.get(show=self.show, seat_number=3, status='booked')
+        response = self.client.post(f'/bookings/{booking.id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        promoted = Booking.objects.get(id=response.data['promoted_booking_id'])
+        self.assertEqual(promoted.user.username, 'testuser2')
+        self.assertEqual(promoted.seat_number, 3)
+        self.assertEqual(WaitlistEntry.objects.get().status, 'promoted')
+    
+    def test_archive_past_shows(self):
+        """Test that past shows move to the archive and stay visible as history"""
+        self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 1})
+        old_show = Show.objects.create(
+            movie=self.movie,
+            screen_name='Screen 2',
+            date_time=datetime.now() - timedelta(days=60),
+            total_seats=10
+        )
+        Booking.objects.create(user=self.user, show=old_show, seat_number=4)
+        
+        call_command('archive_shows', '--days', '30', stdout=StringIO())
+        
+        self.assertFalse(Show.objects.filter(id=old_show.id).exists())
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(ArchivedShow.objects.get().original_id, old_show.id)
+        self.assertEqual(ArchivedBooking.objects.get().seat_number, 4)
+        
+        response = self.client.get('/my-bookings/')
+        self.assertEqual(len(response.data), 1)
+        
+        response = self.client.get('/my-bookings/?include_history=true')
+        self.assertEqual(len(response.data), 2)
+        self.assertTrue(response.data[1]['archived'])
+    
+    def test_archive_spreads_large_show_over_batches(self):
+        """Test that a show with more bookings than the batch size is fully archived"""
+        old_show = Show.objects.create(
+            movie=self.movie,
+            screen_name='Screen 2',
+            date_time=datetime.now() - timedelta(days=60),
+            total_seats=10
+        )
+        for seat in range(1, 6):
+            Booking.objects.create(user=self.user, show=old_show, seat_number=seat)
+        
+        call_command('archive_shows', '--days', '30', '--batch-size', '2', stdout=StringIO())
+        
+        self.assertFalse(Show.objects.filter(id=old_show.id).exists())
+        self.assertEqual(ArchivedShow.objects.count(), 1)
+        self.assertEqual(ArchivedBooking.objects.count(), 5)
+    
+    def test_cancel_all_bookings_requires_staff(self):
+        """Test that regular users cannot bulk-cancel a show"""
+        response = self.client.post(f'/shows/{self.show.id}/cancel-all/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_cancel_all_bookings(self):
+        """Test cancelling every booking of a show in one request"""
+        for i in range(1, 4):
+            self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': i})
+        
+        response = self._login_client('staff', is_staff=True).post(f'/shows/{self.show.id}/cancel-all/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([seat['seat_number'] for seat in response.data['seats']], [1, 2, 3])
+        self.assertFalse(Booking.objects.filter(show=self.show, status='booked').exists())
+    
+    def test_reschedule_show(self):
+        """Test moving bookings to another show, cancelling seats that are not free"""
+        target = Show.objects.create(
+            movie=self.movie,
+            screen_name='Screen 2',
+            date_time=datetime.now() + timedelta(days=2),
+            total_seats=5
+        )
+        for i in (1, 2, 8):
+            self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': i})
+        Booking.objects.create(user=self.user, show=target, seat_number=2)
+        
+        response = self._login_client('staff', is_staff=True).post(f'/shows/{self.show.id}/reschedule/', {
+            'target_show_id': target.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        outcomes = {seat['seat_number']: seat['outcome'] for seat in response.data['seats']}
+        self.assertEqual(outcomes, {1: 'moved', 2: 'cancelled', 8: 'cancelled'})
+        self.assertEqual(Booking.objects.filter(show=target, status='booked').count(), 2)
+        self.assertFalse(Booking.objects.filter(show=self.show, status='booked').exists())
+    
+    def test_metrics_endpoint(self):
+        """Test that booking outcomes are exposed at /metrics"""
+        self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 1})
+        self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 1})
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('booking_book_seat_total{outcome="success"}', body)
+        self.assertIn('booking_book_seat_total{outcome="seat_taken"}', body)
+        self.assertIn('booking_http_request_queries_bucket{view="book-seat"', body)
+    
+    def _recorded_queries(self, view):
+        sample = HTTP_REQUEST_QUERIES.snapshot()['samples'].get(json.dumps([view]))
+        return sample['sum'] if sample else 0
+    
+    async def test_metrics_count_queries_under_asgi(self):
+        """Test that queries of sync views are counted when served through ASGI"""
+        before = self._recorded_queries('book-seat')
+        response = await self.async_client.post(
+            f'/shows/{self.show.id}/book/',
+            {'seat_number': 1},
+            headers={'Authorization': f'Bearer {self.token}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(self._recorded_queries('book-seat'), before)
+    
+    def test_bulk_cancel_counts_cancellations(self):
+        """Test that bulk cancellations show up in the cancellation counter"""
+        for i in range(1, 4):
+            self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': i})
+        key = json.dumps(['bulk_cancelled'])
+        before = CANCEL_TOTAL.snapshot()['samples'].get(key, 0)
+        
+        self._login_client('staff', is_staff=True).post(f'/shows/{self.show.id}/cancel-all/')
+        self.assertEqual(CANCEL_TOTAL.snapshot()['samples'][key] - before, 3)
+    
+    def test_replica_reads_pin_recent_writers_to_primary(self):
+        """Test that list reads go to the replica except right after a user books"""
+        pin_cache().clear()
+        router = ReplicaRouter()
+        
+        with mock.patch('booking.routers.replica_alias', return_value='replica'):
+            with replica_reads(self.user):
+                self.assertEqual(router.db_for_read(Movie), 'replica')
+            self.assertIsNone(router.db_for_read(Movie))
+            self.assertEqual(router.db_for_write(Booking), 'default')
+            
+            self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 1})
+            with replica_reads(self.user):
+                self.assertEqual(router.db_for_read(Booking), 'default')
+
+
+# Changes feed reads run on executor threads, which cannot see the data of an
+# uncommitted TestCase transaction
+@override_settings(CACHES=TEST_CACHES, BOOKING_REPLICA_DATABASE='default')
+class SeatChangesTestCase(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.movie = Movie.objects.create(
+            title='Test Movie',
+            duration_minutes=120
+        )
+        self.show = Show.objects.create(
+            movie=self.movie,
+            screen_name='Screen 1',
+            date_time=datetime.now() + timedelta(days=1),
+            total_seats=10
+        )
+        
+        response = self.client.post('/login/', {
+            'username': 'testuser',
+            'password': 'testpass123'
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+    
+    async def _asgi_get(self, application, path, query_string):
+        """Send a GET through the full ASGI handler and return the status code"""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'root_path': '',
+            'query_string': query_string.encode(),
+            'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        messages = []
+        
+        async def receive():
+            if requests:
+                return requests.pop()
+            # The client stays connected until the response is sent
+            await asyncio.sleep(60)
+            return {'type': 'http.disconnect'}
+        
+        async def send(message):
+            messages.append(message)
+        
+        await application(scope, receive, send)
+        return messages[0]['status']
+    
+    def test_seat_changes_feed(self):
+        """Test that bookings and cancellations show up as versioned seat changes"""
+        response = self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 3})
+        booking_id = response.data['booking']['id']
+        
+        response = self.client.get(f'/shows/{self.show.id}/changes/?since=0&timeout=0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(response.json()['changes'], [
+            {'seat_number': 3, 'available': False, 'version': 1}
+        ])
+        
+        self.client.post(f'/bookings/{booking_id}/cancel/')
+        response = self.client.get(f'/shows/{self.show.id}/changes/?since=1&timeout=0')
+        self.assertEqual(response.json()['version'], 2)
+        self.assertEqual(response.json()['changes'], [
+            {'seat_number': 3, 'available': True, 'version': 2}
+        ])
+        
+        # Nothing changed since the latest version
+        response = self.client.get(f'/shows/{self.show.id}/changes/?since=2&timeout=0')
+        self.assertEqual(response.json()['changes'], [])
+    
+    def test_seat_changes_stream_falls_back_to_long_poll_under_wsgi(self):
+        """Test that WSGI clients asking for SSE get a long-poll response instead"""
+        response = self.client.get(
+            f'/shows/{self.show.id}/changes/?since=0&timeout=0',
+            HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['version'], 0)
+    
+    async def test_seat_changes_stream(self):
+        """Test that ASGI clients asking for SSE get a stream of seat change events"""
+        await sync_to_async(record_seat_changes)(self.show.id, [(4, False)])
+        
+        response = await self.async_client.get(
+            f'/shows/{self.show.id}/changes/?since=0',
+            headers={'Accept': 'text/event-stream'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        events = response.streaming_content
+        first = (await asyncio.wait_for(events.__anext__(), timeout=5)).decode()
+        await events.aclose()
+        self.assertTrue(first.startswith('id: 1\nevent: seats\n'))
+        self.assertIn('"seat_number": 4, "available": false', first)
+    
+    def test_waiting_long_polls_share_bounded_threads(self):
+        """Test that concurrent long-polls under ASGI share a bounded pool of threads for their reads"""
+        polls = 40
+        application = get_asgi_application()
+        read_threads = set()
+        
+        def load_version(show_id):
+            read_threads.add(threading.get_ident())
+            return Show.objects.filter(id=show_id).values_list('change_version', flat=True).first()
+        
+        async def poll_all():
+            return await asyncio.gather(*[
+                self._asgi_get(application, f'/shows/{self.show.id}/changes/', 'since=0&timeout=1')
+                for _ in range(polls)
+            ])
+        
+        # A sync test with its own event loop, as an async test would run every
+        # thread-sensitive call on the test's own thread
+        with mock.patch('booking.changes._load_version', load_version):
+            statuses = asyncio.run(poll_all())
+        
+        self.assertEqual(statuses, [200] * polls)
+        # The event loop's default executor never grows past this many threads,
+        # while a thread per request would give one thread per poll
+        self.assertLessEqual(len(read_threads), min(32, (os.cpu_count() or 1) + 4))
+        self.assertLess(len(read_threads), polls)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReplicaRoutingTestCase(TestCase):
+    databases = {'default', 'replica'}
+    
+    def setUp(self):
+        pin_cache().clear()
+        self.client = APIClient()
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.movie = Movie.objects.create(
+            title='Primary Movie',
+            duration_minutes=120
+        )
+        self.show = Show.objects.create(
+            movie=self.movie,
+            screen_name='Screen 1',
+            date_time=datetime.now() + timedelta(days=1),
+            total_seats=10
+        )
+        
+        # The replica lags behind the primary and only has an older catalog
+        Movie.objects.using('replica').create(
+            title='Replica Movie',
+            duration_minutes=90
+        )
+        
+        response = self.client.post('/login/', {
+            'username': 'testuser',
+            'password': 'testpass123'
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+    
+    def test_list_views_read_from_replica(self):
+        """Test that catalog and history reads are served by the replica"""
+        response = self.client.get('/movies/')
+        self.assertEqual([movie['title'] for movie in response.data], ['Replica Movie'])
+        
+        response = self.client.get(f'/movies/{self.movie.id}/shows/')
+        self.assertEqual(response.data, [])
+        
+        response = self.client.get('/my-bookings/')
+        self.assertEqual(len(response.data), 0)
+    
+    def test_reads_follow_own_writes_after_booking(self):
+        """Test that a user reads from the primary right after booking"""
+        response = self.client.post(f'/shows/{self.show.id}/book/', {'seat_number': 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        response = self.client.get('/my-bookings/')
+        self.assertEqual(len(response.data), 1)
+        
+        response = self.client.get(f'/movies/{self.movie.id}/shows/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['available_seats'], 9)
+    
+    def test_pin_cache_never_culls_live_pins(self):
+        """Test that a full pin cache only drops expired pins"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PinCache(directory, {'OPTIONS': {'MAX_ENTRIES': 5}})
+            cache.set('expired', True, 0.01)
+            time.sleep(0.05)
+            
+            for user_id in range(20):
+                cache.set(PIN_KEY.format(user_id), True, 60)
+            
+            self.assertEqual(len(cache._list_cache_files()), 20)
+            for user_id in range(20):
+                self.assertTrue(cache.get(PIN_KEY.format(user_id)))
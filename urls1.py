@@ -1,8 +1,11 @@
 from django.urls import path
 from .views import (
     SignupView, LoginView, MovieListView, MovieShowsView,
-    BookSeatView, CancelBookingView, MyBookingsView
+    BookSeatView, CancelBookingView, MyBookingsView, ShowWaitlistView,
+    ShowCancelAllView, ShowRescheduleView
 )
+from .metrics import metrics_view
+from .changes import show_changes_view
 
 urlpatterns = [
     path('signup/', SignupView.as_view(), name='signup'),
@@ -10,6 +13,11 @@ urlpatterns = [
     path('movies/', MovieListView.as_view(), name='movie-list'),
     path('movies/<int:movie_id>/shows/', MovieShowsView.as_view(), name='movie-shows'),
     path('shows/<int:show_id>/book/', BookSeatView.as_view(), name='book-seat'),
+    path('shows/<int:show_id>/waitlist/', ShowWaitlistView.as_view(), name='show-waitlist'),
+    path('shows/<int:show_id>/changes/', show_changes_view, name='show-changes'),
+    path('shows/<int:show_id>/cancel-all/', ShowCancelAllView.as_view(), name='show-cancel-all'),
+    path('shows/<int:show_id>/reschedule/', ShowRescheduleView.as_view(), name='show-reschedule'),
     path('bookings/<int:booking_id>/cancel/', CancelBookingView.as_view(), name='cancel-booking'),
     path('my-bookings/', MyBookingsView.as_view(), name='my-bookings'),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
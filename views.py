@@ -1,3 +1,4 @@
+import time
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -6,13 +7,22 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import Movie, Show, Booking
+from .models import Movie, Show, Booking, WaitlistEntry, ArchivedBooking
 from .serializers import (
     UserSignupSerializer, UserLoginSerializer, MovieSerializer,
-    ShowSerializer, BookingSerializer, BookSeatSerializer
+    ShowSerializer, BookingSerializer, BookSeatSerializer,
+    WaitlistEntrySerializer, ArchivedBookingSerializer, RescheduleShowSerializer
 )
+from .bulk import cancel_show_bookings, reschedule_show_bookings
+from .metrics import (
+    BOOK_SEAT_TOTAL, BOOK_SEAT_DURATION, CANCEL_TOTAL,
+    WAITLIST_PROMOTIONS_TOTAL, LOCK_WAIT
+)
+from .routers import replica_reads, pin_to_primary
+from .changes import record_seat_changes
 
 
 class SignupView(APIView):
@@ -105,6 +115,10 @@ class MovieListView(generics.ListAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [permissions.AllowAny]
+    
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            return super().list(request, *args, **kwargs)
 
 
 class MovieShowsView(APIView):
@@ -121,10 +135,11 @@ class MovieShowsView(APIView):
         List all shows for a specific movie
         """
         try:
-            movie = Movie.objects.get(id=movie_id)
-            shows = Show.objects.filter(movie=movie)
-            serializer = ShowSerializer(shows, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            with replica_reads(request.user):
+                movie = Movie.objects.get(id=movie_id)
+                shows = Show.objects.filter(movie=movie)
+                serializer = ShowSerializer(shows, many=True)
+                return Response(serializer.data, status=status.HTTP_200_OK)
         except Movie.DoesNotExist:
             return Response({'error': 'Movie not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -146,9 +161,12 @@ class BookSeatView(APIView):
         """
         Book a seat for a show
         """
+        started = time.perf_counter()
+        outcome = 'error'
         try:
             serializer = BookSeatSerializer(data=request.data)
             if not serializer.is_valid():
+                outcome = 'invalid'
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
             seat_number = serializer.validated_data['seat_number']
@@ -156,10 +174,12 @@ class BookSeatView(APIView):
             try:
                 show = Show.objects.get(id=show_id)
             except Show.DoesNotExist:
+                outcome = 'not_found'
                 return Response({'error': 'Show not found'}, status=status.HTTP_404_NOT_FOUND)
             
             # Validate seat number
             if seat_number > show.total_seats:
+                outcome = 'invalid'
                 return Response({
                     'error': f'Invalid seat number. This show has only {show.total_seats} seats.'
                 }, status=status.HTTP_400_BAD_REQUEST)
@@ -167,13 +187,16 @@ class BookSeatView(APIView):
             # Use transaction to prevent race conditions
             with transaction.atomic():
                 # Check if seat is already booked
+                lock_started = time.perf_counter()
                 existing_booking = Booking.objects.filter(
                     show=show,
                     seat_number=seat_number,
                     status='booked'
                 ).select_for_update().exists()
+                LOCK_WAIT.observe(time.perf_counter() - lock_started, view='book-seat')
                 
                 if existing_booking:
+                    outcome = 'seat_taken'
                     return Response({
                         'error': f'Seat {seat_number} is already booked for this show.'
                     }, status=status.HTTP_400_BAD_REQUEST)
@@ -185,8 +208,10 @@ class BookSeatView(APIView):
                 ).count()
                 
                 if booked_seats >= show.total_seats:
+                    outcome = 'full'
                     return Response({
-                        'error': 'This show is fully booked.'
+                        'error': 'This show is fully booked.',
+                        'waitlist': f'/shows/{show.id}/waitlist/'
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
                 # Create booking
@@ -197,7 +222,10 @@ class BookSeatView(APIView):
                     status='booked'
                 )
                 
+                record_seat_changes(show.id, [(seat_number, False)])
+                pin_to_primary(request.user.id)
                 booking_serializer = BookingSerializer(booking)
+                outcome = 'success'
                 return Response({
                     'message': 'Seat booked successfully',
                     'booking': booking_serializer.data
@@ -205,6 +233,9 @@ class BookSeatView(APIView):
                 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            BOOK_SEAT_TOTAL.inc(outcome=outcome)
+            BOOK_SEAT_DURATION.observe(time.perf_counter() - started, outcome=outcome)
 
 
 class CancelBookingView(APIView):
@@ -221,31 +252,239 @@ class CancelBookingView(APIView):
         """
         Cancel a booking
         """
+        outcome = 'error'
         try:
-            try:
-                booking = Booking.objects.get(id=booking_id)
-            except Booking.DoesNotExist:
-                return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
+            with transaction.atomic():
+                try:
+                    lock_started = time.perf_counter()
+                    booking = Booking.objects.select_for_update().get(id=booking_id)
+                    LOCK_WAIT.observe(time.perf_counter() - lock_started, view='cancel-booking')
+                except Booking.DoesNotExist:
+                    outcome = 'not_found'
+                    return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
+                
+                # Security check: user can only cancel their own booking
+                if booking.user != request.user:
+                    outcome = 'forbidden'
+                    return Response({
+                        'error': 'You can only cancel your own bookings.'
+                    }, status=status.HTTP_403_FORBIDDEN)
+                
+                # Check if already cancelled
+                if booking.status == 'cancelled':
+                    outcome = 'already_cancelled'
+                    return Response({
+                        'error': 'This booking is already cancelled.'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                # Cancel the booking
+                booking.status = 'cancelled'
+                booking.save()
+                
+                # Hand the freed seat to the head of the waitlist, if any
+                promoted = self._promote_next_waiter(booking)
+                record_seat_changes(booking.show_id, [(booking.seat_number, promoted is None)])
+            
+            response_data = {
+                'message': 'Booking cancelled successfully',
+                'booking_id': booking.id
+            }
+            pin_to_primary(request.user.id)
+            if promoted is not None:
+                response_data['promoted_booking_id'] = promoted.id
+                pin_to_primary(promoted.user_id)
+                WAITLIST_PROMOTIONS_TOTAL.inc()
+            outcome = 'cancelled'
+            return Response(response_data, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            CANCEL_TOTAL.inc(outcome=outcome)
+    
+    def _promote_next_waiter(self, booking):
+        """
+        Book the freed seat for the oldest waiting user of the show.
+        Must be called inside the cancelling transaction.
+        """
+        # Serializes with ShowWaitlistView.post, which locks the show row
+        # before checking that the show is full
+        Show.objects.select_for_update().filter(id=booking.show_id).first()
+        
+        entry = WaitlistEntry.objects.select_for_update().filter(
+            show_id=booking.show_id,
+            status='waiting'
+        ).order_by('created_at', 'id').first()
+        
+        if entry is None:
+            return None
+        
+        promoted = Booking.objects.create(
+            user_id=entry.user_id,
+            show_id=booking.show_id,
+            seat_number=booking.seat_number,
+            status='booked'
+        )
+        entry.status = 'promoted'
+        entry.booking = promoted
+        entry.save(update_fields=['status', 'booking', 'updated_at'])
+        return promoted
+
+
+class ShowWaitlistView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @swagger_auto_schema(
+        responses={
+            201: openapi.Response('Joined waitlist', WaitlistEntrySerializer),
+            400: 'Bad Request',
+            404: 'Show not found'
+        }
+    )
+    def post(self, request, show_id):
+        """
+        Join the waitlist of a fully booked show
+        """
+        try:
+            with transaction.atomic():
+                # Lock the show so a concurrent cancellation cannot free a seat
+                # between the full-show check and joining the queue
+                try:
+                    show = Show.objects.select_for_update().get(id=show_id)
+                except Show.DoesNotExist:
+                    return Response({'error': 'Show not found'}, status=status.HTTP_404_NOT_FOUND)
+                
+                booked_seats = Booking.objects.filter(
+                    show=show,
+                    status='booked'
+                ).count()
+                
+                if booked_seats < show.total_seats:
+                    return Response({
+                        'error': 'This show still has available seats. Book a seat instead.'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                if WaitlistEntry.objects.filter(
+                    show=show,
+                    user=request.user,
+                    status='waiting'
+                ).exists():
+                    return Response({
+                        'error': 'You are already on the waitlist for this show.'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                entry = WaitlistEntry.objects.create(user=request.user, show=show)
+            
+            position = WaitlistEntry.objects.filter(
+                show=show,
+                status='waiting',
+                created_at__lte=entry.created_at
+            ).count()
+            
+            return Response({
+                'message': 'Added to waitlist',
+                'position': position,
+                'entry': WaitlistEntrySerializer(entry).data
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @swagger_auto_schema(
+        responses={
+            200: 'Left waitlist',
+            404: 'Not on waitlist'
+        }
+    )
+    def delete(self, request, show_id):
+        """
+        Leave the waitlist of a show
+        """
+        try:
+            updated = WaitlistEntry.objects.filter(
+                show_id=show_id,
+                user=request.user,
+                status='waiting'
+            ).update(status='cancelled', updated_at=timezone.now())
             
-            # Security check: user can only cancel their own booking
-            if booking.user != request.user:
+            if not updated:
                 return Response({
-                    'error': 'You can only cancel your own bookings.'
-                }, status=status.HTTP_403_FORBIDDEN)
+                    'error': 'You are not on the waitlist for this show.'
+                }, status=status.HTTP_404_NOT_FOUND)
+            
+            return Response({'message': 'Removed from waitlist'}, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ShowCancelAllView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        responses={
+            200: 'Bookings cancelled with per-seat outcomes',
+            404: 'Show not found'
+        }
+    )
+    def post(self, request, show_id):
+        """
+        Cancel every booking of a show (staff only)
+        """
+        try:
+            try:
+                seats = cancel_show_bookings(show_id)
+            except Show.DoesNotExist:
+                return Response({'error': 'Show not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Check if already cancelled
-            if booking.status == 'cancelled':
+            return Response({
+                'message': f'Cancelled {len(seats)} bookings',
+                'show_id': show_id,
+                'seats': seats
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ShowRescheduleView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    @swagger_auto_schema(
+        request_body=RescheduleShowSerializer,
+        responses={
+            200: 'Bookings moved with per-seat outcomes',
+            400: 'Bad Request',
+            404: 'Show not found'
+        }
+    )
+    def post(self, request, show_id):
+        """
+        Move every booking of a show to the same seat on another show (staff only).
+        Seats that are taken or missing on the target show are cancelled.
+        """
+        try:
+            serializer = RescheduleShowSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            
+            target_show_id = serializer.validated_data['target_show_id']
+            if target_show_id == show_id:
                 return Response({
-                    'error': 'This booking is already cancelled.'
+                    'error': 'Target show must be different from the source show.'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Cancel the booking
-            booking.status = 'cancelled'
-            booking.save()
+            try:
+                seats = reschedule_show_bookings(show_id, target_show_id)
+            except Show.DoesNotExist as e:
+                return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
             
+            moved = sum(1 for seat in seats if seat['outcome'] == 'moved')
             return Response({
-                'message': 'Booking cancelled successfully',
-                'booking_id': booking.id
+                'message': f'Moved {moved} bookings, cancelled {len(seats) - moved}',
+                'show_id': show_id,
+                'target_show_id': target_show_id,
+                'seats': seats
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -254,10 +493,33 @@ class CancelBookingView(APIView):
 
 class MyBookingsView(generics.ListAPIView):
     """
-    List all bookings for the logged-in user
+    List all bookings for the logged-in user.
+    Pass ?include_history=true to also list bookings of archived shows.
     """
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
\ No newline at end of file
+        return Booking.objects.filter(user=self.request.user)
+    
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'include_history', openapi.IN_QUERY,
+                description='Also include bookings of archived (past) shows',
+                type=openapi.TYPE_BOOLEAN
+            )
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        with replica_reads(request.user):
+            response = self.list(request, *args, **kwargs)
+            
+            include_history = request.query_params.get('include_history', '').lower()
+            if include_history in ('1', 'true', 'yes'):
+                archived = ArchivedBooking.objects.filter(
+                    user=request.user
+                ).select_related('user', 'show__movie')
+                response.data = list(response.data) + ArchivedBookingSerializer(archived, many=True).data
+        
+        return response